@@ -1,5 +1,16 @@
-from openai import OpenAI
-from typing import List, Optional, Dict, Any
+import asyncio
+import hashlib
+import json
+import httpx
+from openai import AsyncOpenAI
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
+from semantic_cache import SemanticCache
+
+# Prefer orjson for per-round tool argument parsing; it is a drop-in for json.loads
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 class AIGenerator:
     """Handles interactions with ModelScope's Qwen API for generating responses"""
@@ -30,12 +41,33 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
     
-    def __init__(self, api_key: str, model: str):
-        self.client = OpenAI(
+    # History goes in its own message so the system prompt stays byte-identical
+    # across turns and remains a cacheable prefix for the provider
+    _HISTORY_PREFIX = "Previous conversation:\n"
+    
+    # Yielded by stream_response when text already streamed turns out to be a tool-call preamble
+    STREAM_RESET = object()
+    
+    def __init__(self, api_key: str, model: str, cache_control: bool = False,
+                 semantic_cache: Optional[SemanticCache] = None):
+        # Shared connection pool so every completion reuses keep-alive sockets
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=httpx.Timeout(60.0, connect=5.0)
+        )
+        self.client = AsyncOpenAI(
             base_url='https://api-inference.modelscope.cn/v1',
             api_key=api_key,
+            http_client=self._http,
         )
         self.model = model
+        # Emit Anthropic-style cache_control breakpoints (only for providers that accept them)
+        self.cache_control = cache_control
+        # Answers to standalone queries that needed no tools, keyed by query embedding
+        self.semantic_cache = semantic_cache
+        # Single-flight map: request key -> task shared by identical concurrent calls
+        self._inflight: Dict[str, asyncio.Task] = {}
         
         # Pre-build base API parameters
         self.base_params = {
@@ -44,10 +76,15 @@ Provide only the direct answer to what was asked.
             "max_tokens": 800
         }
     
-    def generate_response(self, query: str,
-                         conversation_history: Optional[str] = None,
-                         tools: Optional[List] = None,
-                         tool_manager=None) -> str:
+    async def aclose(self):
+        """Close the shared HTTP connection pool"""
+        await self._http.aclose()
+    
+    async def generate_response(self, query: str,
+                               conversation_history: Optional[str] = None,
+                               tools: Optional[List] = None,
+                               tool_manager=None,
+                               cache_query: Optional[str] = None) -> Tuple[str, List[str]]:
         """
         Generate AI response with optional tool usage and conversation context.
         Supports sequential tool calling with up to 2 rounds.
@@ -57,22 +94,190 @@ Provide only the direct answer to what was asked.
             conversation_history: Previous messages for context
             tools: Available tools the AI can use
             tool_manager: Manager to execute tools
+            cache_query: Text the semantic cache embeds, e.g. the raw user question
+                         without prompt wrapping (defaults to query)
             
         Returns:
-            Generated response as string
+            Tuple of (generated response, sources from this request's tool calls)
         """
+        # Identical in-flight requests share one upstream call
+        key = self._request_key(query, conversation_history, tools, tool_manager)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._generate_response(query, conversation_history, tools, tool_manager, cache_query)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
         
-        # Build system content efficiently - avoid string ops when possible
-        if conversation_history:
-            system_content = f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-        else:
-            system_content = self.SYSTEM_PROMPT
+        # Shield so one caller disconnecting does not cancel the shared call; the task
+        # carries its own sources, and each caller gets a private copy of the list
+        answer, sources = await asyncio.shield(task)
+        return answer, list(sources)
+    
+    @staticmethod
+    def _request_key(query: str, conversation_history: Optional[str],
+                     tools: Optional[List], tool_manager) -> str:
+        """Hash everything that varies the prompt (the system prompt is static)"""
+        tools_hash = ""
+        if tools:
+            # ToolManager precomputes a schema hash; encode ad-hoc tool lists directly
+            tools_hash = getattr(tool_manager, 'tools_hash', None) or json.dumps(tools, sort_keys=True)
+        payload = "\0".join((tools_hash, conversation_history or "", query))
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+    
+    async def _generate_response(self, query: str, conversation_history: Optional[str],
+                                 tools: Optional[List], tool_manager,
+                                 cache_query: Optional[str]) -> Tuple[str, List[str]]:
+        """Uncoalesced body of generate_response"""
+        api_params = self._build_api_params(query, conversation_history, tools)
         
-        # Prepare initial messages
-        messages = [
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": query}
-        ]
+        try:
+            # Serve near-duplicate standalone queries from the semantic cache
+            query_embedding, cached_answer = await self._lookup_cached_answer(
+                cache_query or query, conversation_history
+            )
+            if cached_answer is not None:
+                return cached_answer, []
+            
+            if tools and tool_manager:
+                # Handle sequential tool execution with up to 2 rounds
+                answer, direct, sources = await self._handle_sequential_tool_execution(
+                    api_params, tool_manager
+                )
+            else:
+                # Get direct response if no tools or tool manager
+                response = await self.client.chat.completions.create(**api_params)
+                answer, direct, sources = response.choices[0].message.content, True, []
+            
+            if direct:
+                self._store_cached_answer(query_embedding, answer)
+            return answer, sources
+            
+        except Exception as e:
+            # Return a more descriptive error message
+            return f"Query failed: {str(e)}", []
+    
+    async def stream_response(self, query: str,
+                              conversation_history: Optional[str] = None,
+                              tools: Optional[List] = None,
+                              tool_manager=None,
+                              sources: Optional[List[str]] = None,
+                              cache_query: Optional[str] = None) -> AsyncIterator[Any]:
+        """
+        Stream AI response text as it is generated.
+        Each round streams live until its first tool-call fragment arrives; later text
+        in that round is held back. If the round does run tools, STREAM_RESET is yielded
+        so the caller discards the preamble already streamed, and the next round starts over.
+        Unlike generate_response, streams are not coalesced: each is its own upstream call.
+        
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            sources: Optional per-request list that receives this request's tool sources
+            cache_query: Text the semantic cache embeds (defaults to query)
+            
+        Yields:
+            Fragments of the generated response, or STREAM_RESET to discard those so far
+        """
+        api_params = self._build_api_params(query, conversation_history, tools)
+        messages = api_params["messages"]
+        use_tools = bool(tools and tool_manager)
+        request_sources = []
+        
+        # Keep track of rounds to limit to 2
+        round_count = 0
+        max_rounds = 2
+        
+        try:
+            # Serve near-duplicate standalone queries from the semantic cache
+            query_embedding, cached_answer = await self._lookup_cached_answer(
+                cache_query or query, conversation_history
+            )
+            if cached_answer is not None:
+                yield cached_answer
+                return
+            
+            while True:
+                stream_params = {
+                    **self.base_params,
+                    "messages": self._apply_cache_control(messages),
+                    "stream": True
+                }
+                # Offer tools until the round limit, then force a text answer
+                tools_offered = use_tools and round_count < max_rounds
+                if tools_offered:
+                    stream_params["tools"] = api_params["tools"]
+                    stream_params["tool_choice"] = "auto"
+                
+                stream = await self.client.chat.completions.create(**stream_params)
+                content_parts = []
+                streamed = 0  # Leading content parts already yielded to the caller
+                tool_calls = {}  # Stream index -> accumulated call fragments
+                finish_reason = None
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].finish_reason:
+                        finish_reason = chunk.choices[0].finish_reason
+                    delta = chunk.choices[0].delta
+                    for fragment in delta.tool_calls or []:
+                        call = tool_calls.setdefault(fragment.index, {"id": "", "name": "", "arguments": ""})
+                        if fragment.id:
+                            call["id"] = fragment.id
+                        if fragment.function:
+                            call["name"] += fragment.function.name or ""
+                            call["arguments"] += fragment.function.arguments or ""
+                    if delta.content:
+                        content_parts.append(delta.content)
+                        # Stream live until the model starts calling tools
+                        if not tool_calls:
+                            streamed += 1
+                            yield delta.content
+                
+                content = "".join(content_parts)
+                calls = [(tool_calls[index]["id"], tool_calls[index]["name"], tool_calls[index]["arguments"])
+                         for index in sorted(tool_calls)]
+                if not self._is_tool_round(finish_reason, calls):
+                    # Final round - release any text held back after tool-call fragments
+                    held = "".join(content_parts[streamed:])
+                    if held:
+                        yield held
+                    if round_count == 0:
+                        self._store_cached_answer(query_embedding, content)
+                    return
+                
+                if streamed:
+                    # Text already streamed was only the preamble to these tool calls
+                    yield self.STREAM_RESET
+                
+                try:
+                    request_sources = await self._run_tool_round(
+                        messages, content, calls, tool_manager, request_sources
+                    )
+                except Exception as e:
+                    yield f"Tool execution failed: {str(e)}"
+                    return
+                if sources is not None:
+                    sources[:] = request_sources
+                
+                round_count += 1
+                
+        except Exception as e:
+            # Return a more descriptive error message
+            yield f"Query failed: {str(e)}"
+    
+    def _build_api_params(self, query: str, conversation_history: Optional[str],
+                          tools: Optional[List]) -> Dict[str, Any]:
+        """Build the initial chat completion parameters for a query"""
+        # Static system prompt first, then history as a separate exchange
+        messages = [{"role": "system", "content": self.SYSTEM_PROMPT}]
+        if conversation_history:
+            messages.append({"role": "user", "content": self._HISTORY_PREFIX + conversation_history})
+            messages.append({"role": "assistant", "content": "Understood."})
+        messages.append({"role": "user", "content": query})
         
         # Add tools if available (ModelScope Qwen supports tools)
         api_params = {
@@ -81,35 +286,29 @@ Provide only the direct answer to what was asked.
         }
         
         if tools:
-            # Convert tools to OpenAI format
-            openai_tools = []
-            for tool in tools:
-                openai_tool = {
-                    "type": "function",
-                    "function": {
-                        "name": tool["name"],
-                        "description": tool["description"],
-                        "parameters": tool["input_schema"]
+            if tools[0].get("type") == "function":
+                # Already in OpenAI format (e.g. ToolManager.get_openai_tool_definitions);
+                # shallow copy so the shared cached tuple is never handed out for mutation
+                openai_tools = list(tools)
+            else:
+                # Convert tools to OpenAI format
+                openai_tools = []
+                for tool in tools:
+                    openai_tool = {
+                        "type": "function",
+                        "function": {
+                            "name": tool["name"],
+                            "description": tool["description"],
+                            "parameters": tool["input_schema"]
+                        }
                     }
-                }
-                openai_tools.append(openai_tool)
+                    openai_tools.append(openai_tool)
             api_params["tools"] = openai_tools
             api_params["tool_choice"] = "auto"
-        
-        try:
-            # Handle sequential tool execution with up to 2 rounds
-            if tools and tool_manager:
-                return self._handle_sequential_tool_execution(api_params, tool_manager)
-            
-            # Get direct response if no tools or tool manager
-            response = self.client.chat.completions.create(**api_params)
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            # Return a more descriptive error message
-            return f"Query failed: {str(e)}"
+        return api_params
     
-    def _handle_sequential_tool_execution(self, initial_params: Dict[str, Any], tool_manager):
+    async def _handle_sequential_tool_execution(self, initial_params: Dict[str, Any],
+                                                tool_manager) -> Tuple[str, bool, List[str]]:
         """
         Handle sequential tool execution with up to 2 rounds of tool calls.
         
@@ -118,10 +317,12 @@ Provide only the direct answer to what was asked.
             tool_manager: Manager to execute tools
             
         Returns:
-            Final response text after all tool execution
+            Tuple of (final response text, whether it was answered directly without tools,
+            sources from the latest tool call that produced any)
         """
         messages = initial_params["messages"].copy()
         tools = initial_params.get("tools", [])
+        sources = []
         
         # Keep track of rounds to limit to 2
         round_count = 0
@@ -132,43 +333,28 @@ Provide only the direct answer to what was asked.
                 # Prepare API call with current messages and tools
                 api_params = {
                     **self.base_params,
-                    "messages": messages,
+                    "messages": self._apply_cache_control(messages),
                     "tools": tools,
                     "tool_choice": "auto"
                 }
                 
                 # Get response from AI
-                response = self.client.chat.completions.create(**api_params)
+                response = await self.client.chat.completions.create(**api_params)
                 choice = response.choices[0]
                 
                 # Check if we have tool calls
-                if choice.finish_reason == "tool_calls" and choice.message.tool_calls:
-                    # Add AI's response to messages
-                    messages.append(choice.message)
-                    
-                    # Execute all tool calls and collect results
-                    tool_results = []
-                    for tool_call in choice.message.tool_calls:
-                        try:
-                            import json
-                            # Execute tool with provided arguments
-                            tool_result = tool_manager.execute_tool(
-                                tool_call.function.name, 
-                                **json.loads(tool_call.function.arguments)  # Convert string arguments to dict
-                            )
-                            
-                            tool_results.append({
-                                "tool_call_id": tool_call.id,
-                                "role": "tool",
-                                "name": tool_call.function.name,
-                                "content": tool_result
-                            })
-                        except Exception as e:
-                            # If a tool fails, return error message
-                            return f"Tool execution failed: {str(e)}"
-                    
-                    # Add all tool results to messages
-                    messages.extend(tool_results)
+                if self._is_tool_round(choice.finish_reason, choice.message.tool_calls):
+                    # Record the request, execute all tool calls and add their results
+                    try:
+                        sources = await self._run_tool_round(
+                            messages, choice.message.content,
+                            [(tool_call.id, tool_call.function.name, tool_call.function.arguments)
+                             for tool_call in choice.message.tool_calls],
+                            tool_manager, sources
+                        )
+                    except Exception as e:
+                        # If a tool fails, return error message
+                        return f"Tool execution failed: {str(e)}", False, sources
                     
                     # Increment round counter
                     round_count += 1
@@ -177,17 +363,156 @@ Provide only the direct answer to what was asked.
                     continue
                 else:
                     # No more tool calls, return final response
-                    return choice.message.content
+                    return choice.message.content, round_count == 0, sources
             
             # If we've reached max rounds, make one final call without tools
             final_params = {
                 **self.base_params,
-                "messages": messages
+                "messages": self._apply_cache_control(messages)
             }
             
-            final_response = self.client.chat.completions.create(**final_params)
-            return final_response.choices[0].message.content
+            final_response = await self.client.chat.completions.create(**final_params)
+            return final_response.choices[0].message.content, False, sources
             
         except Exception as e:
             # Return a more descriptive error message
-            return f"Sequential tool execution failed: {str(e)}"
\ No newline at end of file
+            return f"Sequential tool execution failed: {str(e)}", False, sources
+    
+    async def _lookup_cached_answer(self, cache_query: str,
+                                    conversation_history: Optional[str]) -> Tuple[Any, Optional[str]]:
+        """
+        Embed a standalone query and look it up in the semantic cache.
+        
+        Returns:
+            Tuple of (embedding to store the answer under, or None when the cache
+            does not apply; the cached answer, or None on a miss)
+        """
+        if not self.semantic_cache or conversation_history:
+            return None, None
+        query_embedding = await asyncio.to_thread(self.semantic_cache.embed, cache_query)
+        return query_embedding, self.semantic_cache.lookup(query_embedding)
+    
+    def _store_cached_answer(self, query_embedding, answer: Optional[str]):
+        """Cache an answer produced without tool calls (tool answers also carry sources)"""
+        if query_embedding is not None and answer:
+            self.semantic_cache.add(query_embedding, answer)
+    
+    @staticmethod
+    def _is_tool_round(finish_reason: Optional[str], tool_calls) -> bool:
+        """A round runs tools only when the model stopped to call them and named some"""
+        return finish_reason == "tool_calls" and bool(tool_calls)
+    
+    async def _run_tool_round(self, messages: List, content: Optional[str],
+                              tool_calls: List[Tuple[str, str, Optional[str]]],
+                              tool_manager, sources: List[str]) -> List[str]:
+        """
+        Record the assistant's tool request, run the tools and append their results.
+        
+        Args:
+            messages: Running conversation, extended in place
+            content: Text the model wrote alongside its tool calls
+            tool_calls: (call id, tool name, JSON argument string) for each call
+            tool_manager: Manager to execute tools
+            sources: The request's sources so far
+            
+        Returns:
+            This round's sources if it produced any, otherwise the sources passed in
+        """
+        messages.append({
+            "role": "assistant",
+            "content": content or None,
+            "tool_calls": [{
+                "id": call_id,
+                "type": "function",
+                "function": {"name": name, "arguments": arguments}
+            } for call_id, name, arguments in tool_calls]
+        })
+        tool_results, round_sources = await self._execute_tool_calls(tool_calls, tool_manager)
+        messages.extend(tool_results)
+        return round_sources or sources
+    
+    async def _execute_tool_calls(self, tool_calls: List[Tuple[str, str, Optional[str]]],
+                                  tool_manager) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Execute independent tool calls concurrently in worker threads.
+        
+        Args:
+            tool_calls: (call id, tool name, JSON argument string) for each call
+            tool_manager: Manager to execute tools
+            
+        Returns:
+            Tuple of (tool result messages in the original call order,
+            sources of the last call in that order that produced any)
+        """
+        results = await asyncio.gather(
+            *(self._run_tool_call(name, arguments, tool_manager) for _, name, arguments in tool_calls),
+            return_exceptions=True
+        )
+        
+        tool_results = []
+        sources = []
+        for (call_id, name, _), result in zip(tool_calls, results):
+            if isinstance(result, Exception):
+                raise result
+            
+            # Pick sources by call order, not by which thread finished last
+            tool_result, call_sources = result
+            if call_sources:
+                sources = call_sources
+            
+            tool_results.append({
+                "tool_call_id": call_id,
+                "role": "tool",
+                "name": name,
+                "content": tool_result
+            })
+        return tool_results, sources
+    
+    async def _run_tool_call(self, name: str, arguments: Optional[str],
+                             tool_manager) -> Tuple[str, List[str]]:
+        """Run one tool call in a worker thread; bad arguments become that call's result"""
+        kwargs = self._parse_tool_arguments(arguments)
+        if kwargs is None:
+            return f"Invalid arguments for tool '{name}': expected a JSON object", []
+        
+        return await asyncio.to_thread(tool_manager.execute_tool_with_sources, name, **kwargs)
+    
+    @staticmethod
+    def _parse_tool_arguments(arguments: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Convert tool-call argument string to dict, or None if it is not a JSON object"""
+        try:
+            parsed = json_loads(arguments or "{}")
+        except json.JSONDecodeError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+    
+    def _apply_cache_control(self, messages: List) -> List:
+        """
+        Mark cache breakpoints on the system prompt and the second-to-last message.
+        
+        Returns a copy so earlier breakpoints never accumulate in the running
+        conversation; the input list is returned unchanged when disabled.
+        """
+        if not self.cache_control:
+            return messages
+        
+        marked = list(messages)
+        for index in {0, len(marked) - 2}:
+            if index >= 0:
+                marked[index] = self._mark(marked[index])
+        return marked
+    
+    @staticmethod
+    def _mark(message) -> Dict[str, Any]:
+        """Return message as a dict with its text content tagged as an ephemeral cache block"""
+        if not isinstance(message, dict):
+            # Assistant messages from the SDK are pydantic models
+            message = message.model_dump(exclude_none=True)
+        
+        content = message.get("content")
+        if isinstance(content, str):
+            message = {
+                **message,
+                "content": [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}]
+            }
+        return message
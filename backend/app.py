@@ -5,8 +5,10 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+import json
 import os
 
 from config import config
@@ -63,7 +65,7 @@ async def query_documents(request: QueryRequest):
             session_id = rag_system.session_manager.create_session()
         
         # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
+        answer, sources = await rag_system.query(request.query, session_id)
         
         return QueryResponse(
             answer=answer,
@@ -73,6 +75,27 @@ async def query_documents(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/query/stream")
+async def stream_query_documents(request: QueryRequest):
+    """Process a query and stream the response as server-sent events"""
+    # Create session if not provided
+    session_id = request.session_id
+    if not session_id:
+        session_id = rag_system.session_manager.create_session()
+    
+    async def event_stream():
+        async for event in rag_system.query_stream(request.query, session_id):
+            if event["type"] == "done":
+                event["session_id"] = session_id
+            yield f"data: {json.dumps(event)}\n\n"
+    
+    # Ask proxies (e.g. nginx) not to cache or buffer the event stream
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/courses", response_model=CourseStats)
 async def get_course_stats():
     """Get course analytics and statistics"""
@@ -106,6 +129,11 @@ async def startup_event():
         except Exception as e:
             print(f"Error loading documents: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled API connections on shutdown"""
+    await rag_system.ai_generator.aclose()
+
 # Custom static file handler with no-cache headers for development
 from fastapi.responses import FileResponse
 import os
@@ -11,6 +11,7 @@ class Config:
     # ModelScope API settings
     MODELSCOPE_API_KEY: str = os.getenv("MODELSCOPE_API_KEY", "")
     MODELSCOPE_MODEL: str = "Qwen/Qwen3-Coder-480B-A35B-Instruct"
+    ENABLE_CACHE_CONTROL: bool = False  # Anthropic-style prompt cache breakpoints
     
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -20,6 +21,7 @@ class Config:
     CHUNK_OVERLAP: int = 100     # Characters to overlap between chunks
     MAX_RESULTS: int = 5         # Maximum search results to return
     MAX_HISTORY: int = 2         # Number of conversation messages to remember
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Cosine similarity needed to reuse an answer
     
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
@@ -1,9 +1,10 @@
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, AsyncIterator, Any
 import os
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from ai_generator import AIGenerator
 from session_manager import SessionManager
+from semantic_cache import SemanticCache
 from search_tools import ToolManager, CourseSearchTool, CourseOutlineTool
 from models import Course, Lesson, CourseChunk
 
@@ -16,7 +17,11 @@ class RAGSystem:
         # Initialize core components
         self.document_processor = DocumentProcessor(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
         self.vector_store = VectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS)
-        self.ai_generator = AIGenerator(config.MODELSCOPE_API_KEY, config.MODELSCOPE_MODEL)
+        self.semantic_cache = SemanticCache(self.vector_store.embedding_function,
+                                            config.SEMANTIC_CACHE_THRESHOLD)
+        self.ai_generator = AIGenerator(config.MODELSCOPE_API_KEY, config.MODELSCOPE_MODEL,
+                                        cache_control=config.ENABLE_CACHE_CONTROL,
+                                        semantic_cache=self.semantic_cache)
         self.session_manager = SessionManager(config.MAX_HISTORY)
         
         # Initialize search tools
@@ -46,6 +51,9 @@ class RAGSystem:
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
             
+            # Cached tool results may no longer reflect the knowledge base
+            self.clear_caches()
+            
             return course, len(course_chunks)
         except Exception as e:
             import traceback
@@ -103,9 +111,13 @@ class RAGSystem:
                     print(f"Error processing {file_name}: {e}")
                     print(f"Traceback: {traceback.format_exc()}")
         
+        # Cached tool results may no longer reflect the knowledge base
+        if clear_existing or total_courses:
+            self.clear_caches()
+        
         return total_courses, total_chunks
     
-    def query(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
+    async def query(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
         """
         Process a user query using the RAG system with tool-based search.
         
@@ -124,20 +136,16 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
         
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
+        # Generate response using AI with tools; sources come back with this request's
+        # answer rather than from shared tool state other concurrent queries also write
+        response, sources = await self.ai_generator.generate_response(
             query=prompt,
             conversation_history=history,
-            tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager
+            tools=self.tool_manager.get_openai_tool_definitions(),
+            tool_manager=self.tool_manager,
+            cache_query=query  # Embed the bare question, not the shared prompt prefix
         )
         
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
-
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
-        
         # Update conversation history
         if session_id:
             self.session_manager.add_exchange(session_id, query, response)
@@ -145,6 +153,52 @@ class RAGSystem:
         # Return response with sources from tool searches
         return response, sources
     
+    async def query_stream(self, query: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user query like query(), streaming the response as it is generated.
+        
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+            
+        Yields:
+            {"type": "delta", "content": ...} events, {"type": "reset"} when the deltas so far
+            were a tool-call preamble to discard, then one {"type": "done", "sources": [...]}
+        """
+        prompt = f"""Answer this question about course materials: {query}"""
+        
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+        
+        parts = []
+        sources = []  # Filled by the generator with this request's tool sources
+        async for delta in self.ai_generator.stream_response(
+            query=prompt,
+            conversation_history=history,
+            tools=self.tool_manager.get_openai_tool_definitions(),
+            tool_manager=self.tool_manager,
+            sources=sources,
+            cache_query=query
+        ):
+            if delta is AIGenerator.STREAM_RESET:
+                # Keep the preamble out of both the client's answer and session history
+                parts.clear()
+                yield {"type": "reset"}
+                continue
+            parts.append(delta)
+            yield {"type": "delta", "content": delta}
+        
+        if session_id:
+            self.session_manager.add_exchange(session_id, query, "".join(parts))
+        
+        yield {"type": "done", "sources": sources}
+    
+    def clear_caches(self):
+        """Drop cached tool results and cached answers after the knowledge base changes"""
+        self.tool_manager.clear_caches()
+        self.semantic_cache.clear()
+    
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
         return {
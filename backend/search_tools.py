@@ -1,9 +1,43 @@
-from typing import Dict, Any, Optional, Protocol
+from typing import Dict, Any, Optional, Protocol, List, Tuple
 from abc import ABC, abstractmethod
 from vector_store import VectorStore, SearchResults
+from collections import OrderedDict
+import threading
+import hashlib
+import inspect
 import json
 
 
+class ToolResultCache:
+    """Thread-safe bounded LRU cache for tool outputs keyed by call arguments"""
+    
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # Tools run in worker threads
+    
+    def get(self, key):
+        """Return cached value for key (marking it recently used) or None"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+    
+    def put(self, key, value):
+        """Store value for key, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+
 class Tool(ABC):
     """Abstract base class for all tools"""
     
@@ -16,6 +50,10 @@ class Tool(ABC):
     def execute(self, **kwargs) -> str:
         """Execute the tool with given parameters"""
         pass
+    
+    def execute_with_sources(self, **kwargs) -> Tuple[str, List[str]]:
+        """Execute the tool and return its output along with the UI sources it produced"""
+        return self.execute(**kwargs), []
 
 
 class CourseSearchTool(Tool):
@@ -23,7 +61,7 @@ class CourseSearchTool(Tool):
     
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
-        self.last_sources = []  # Track sources from last search
+        self.cache = ToolResultCache()  # (query, course_name, lesson_number) -> (text, sources)
     
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
@@ -62,6 +100,22 @@ class CourseSearchTool(Tool):
         Returns:
             Formatted search results or error message
         """
+        return self.execute_with_sources(query, course_name, lesson_number)[0]
+    
+    def execute_with_sources(self, query: str, course_name: Optional[str] = None,
+                             lesson_number: Optional[int] = None) -> Tuple[str, List[str]]:
+        """
+        Run the search and return its sources with the result, so concurrent calls stay independent.
+        
+        Returns:
+            Tuple of (formatted results or error message, sources for the UI)
+        """
+        # Serve repeated searches without re-embedding or querying Chroma
+        key = (query, course_name, lesson_number)
+        cached = self.cache.get(key)
+        if cached is not None:
+            text, sources = cached
+            return text, list(sources)
         
         # Use the vector store's unified search interface
         results = self.store.search(
@@ -72,7 +126,7 @@ class CourseSearchTool(Tool):
         
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
         
         # Handle empty results
         if results.is_empty():
@@ -81,43 +135,45 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
         
-        # Format and return results
-        return self._format_results(results)
+        # Format, cache and return results (errors and empty results are not cached)
+        text, sources = self._format_results(results)
+        self.cache.put(key, (text, list(sources)))
+        return text, sources
     
-    def _format_results(self, results: SearchResults) -> str:
+    def _format_results(self, results: SearchResults) -> Tuple[str, List[str]]:
         """Format search results with course and lesson context"""
-        formatted = []
-        sources = []  # Track sources for the UI
+        documents = results.documents
+        metadata = results.metadata
+        count = len(documents)
+        formatted = [None] * count
+        sources = [None] * count  # Track sources for the UI
         
-        for doc, meta in zip(results.documents, results.metadata):
+        # Fetch every lesson link in one catalog lookup instead of one per result
+        lesson_links = self.store.get_lesson_links_bulk([
+            (meta.get('course_title', 'unknown'), meta.get('lesson_number'))
+            for meta in metadata if meta.get('lesson_number') is not None
+        ])
+        
+        for i in range(count):
+            meta = metadata[i]
             course_title = meta.get('course_title', 'unknown')
             lesson_num = meta.get('lesson_number')
             
-            # Build context header
-            header = f"[{course_title}"
-            if lesson_num is not None:
-                header += f" - Lesson {lesson_num}"
-            header += "]"
-            
-            # Track source for the UI (now including lesson link info)
-            source = course_title
-            if lesson_num is not None:
-                source += f" - Lesson {lesson_num}"
-                
-                # Get lesson link from vector store if available
-                lesson_link = self.store.get_lesson_link(course_title, lesson_num)
-                if lesson_link:
-                    source += f"||{lesson_link}"  # Use separator to pass link info
-            sources.append(source)
+            # Same label serves as context header and UI source
+            if lesson_num is None:
+                label = course_title
+                lesson_link = None
+            else:
+                label = "%s - Lesson %s" % (course_title, lesson_num)
+                lesson_link = lesson_links.get((course_title, lesson_num))
             
-            formatted.append(f"{header}\n{doc}")
-        
-        # Store sources for retrieval
-        self.last_sources = sources
+            # Use separator to pass link info to the UI
+            sources[i] = "%s||%s" % (label, lesson_link) if lesson_link else label
+            formatted[i] = "[%s]\n%s" % (label, documents[i])
         
-        return "\n\n".join(formatted)
+        return "\n\n".join(formatted), sources
 
 
 class CourseOutlineTool(Tool):
@@ -125,6 +181,7 @@ class CourseOutlineTool(Tool):
     
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
+        self.cache = ToolResultCache()  # course_title -> formatted outline
     
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return tool definition for course outline retrieval"""
@@ -153,47 +210,26 @@ class CourseOutlineTool(Tool):
         Returns:
             Formatted course outline information or error message
         """
+        cached = self.cache.get(course_title)
+        if cached is not None:
+            return cached
+        
         # Use the vector store to find the best matching course
         resolved_course_title = self.store._resolve_course_name(course_title)
         
         if not resolved_course_title:
             return f"No course found matching '{course_title}'"
         
-        # Get course metadata
+        # Get course outline
         try:
-            # Get course by ID (title is the ID)
-            results = self.store.course_catalog.get(ids=[resolved_course_title])
-            
-            if not results or 'metadatas' not in results or not results['metadatas']:
+            # Served from the store's in-memory catalog, which falls back to Chroma on a miss
+            entry = self.store.get_catalog_entry(resolved_course_title)
+            if entry is None:
                 return f"Course metadata not found for '{resolved_course_title}'"
             
-            metadata = results['metadatas'][0]
-            
-            # Extract course information
-            course_title = metadata.get('title', resolved_course_title)
-            course_link = metadata.get('course_link', 'No link available')
-            lessons_json = metadata.get('lessons_json', '[]')
-            
-            # Parse lessons
-            try:
-                lessons = json.loads(lessons_json)
-            except json.JSONDecodeError:
-                lessons = []
-            
-            # Format the response
-            outline_lines = [f"Course Title: {course_title}"]
-            outline_lines.append(f"Course Link: {course_link}")
-            outline_lines.append("Lessons:")
-            
-            if lessons:
-                for lesson in lessons:
-                    lesson_num = lesson.get('lesson_number', 'Unknown')
-                    lesson_title = lesson.get('lesson_title', 'Untitled')
-                    outline_lines.append(f"  {lesson_num}. {lesson_title}")
-            else:
-                outline_lines.append("  No lessons available")
-            
-            return "\n".join(outline_lines)
+            outline = entry['outline_text']
+            self.cache.put(course_title, outline)
+            return outline
             
         except Exception as e:
             return f"Error retrieving course outline: {str(e)}"
@@ -204,6 +240,12 @@ class ToolManager:
     
     def __init__(self):
         self.tools = {}
+        self._tool_defs = {}  # Tool name -> definition, captured at registration
+        self._signatures = {}  # Tool name -> execute() signature for argument checks
+        # Derived payloads rebuilt only when the tool set changes
+        self._definitions = ()
+        self._openai_defs = ()
+        self.tools_hash = hashlib.blake2b(b"[]", digest_size=16).hexdigest()
     
     def register_tool(self, tool: Tool):
         """Register any tool that implements the Tool interface"""
@@ -212,29 +254,57 @@ class ToolManager:
         if not tool_name:
             raise ValueError("Tool must have a 'name' in its definition")
         self.tools[tool_name] = tool
-
+        self._tool_defs[tool_name] = tool_def
+        self._signatures[tool_name] = inspect.signature(tool.execute)
+        self._rebuild_definitions()
+    
+    def _rebuild_definitions(self):
+        """Rebuild cached definition tuples and the schema hash"""
+        self._definitions = tuple(self._tool_defs.values())
+        self._openai_defs = tuple({
+            "type": "function",
+            "function": {
+                "name": tool_def["name"],
+                "description": tool_def["description"],
+                "parameters": tool_def["input_schema"]
+            }
+        } for tool_def in self._definitions)
+        tools_json = json.dumps(self._openai_defs, separators=(',', ':'))
+        self.tools_hash = hashlib.blake2b(tools_json.encode(), digest_size=16).hexdigest()
+    
+    def get_tool_definitions(self) -> Tuple[Dict[str, Any], ...]:
+        """Get all tool definitions for Anthropic tool calling (shared; do not mutate)"""
+        return self._definitions
     
-    def get_tool_definitions(self) -> list:
-        """Get all tool definitions for Anthropic tool calling"""
-        return [tool.get_tool_definition() for tool in self.tools.values()]
+    def get_openai_tool_definitions(self) -> Tuple[Dict[str, Any], ...]:
+        """Get cached tool definitions in OpenAI function-calling format (shared; do not mutate)"""
+        return self._openai_defs
     
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         """Execute a tool by name with given parameters"""
+        return self.execute_tool_with_sources(tool_name, **kwargs)[0]
+    
+    def execute_tool_with_sources(self, tool_name: str, **kwargs) -> Tuple[str, List[str]]:
+        """Execute a tool by name and return (result, sources produced by this call)"""
         if tool_name not in self.tools:
-            return f"Tool '{tool_name}' not found"
+            return f"Tool '{tool_name}' not found", []
+        
+        error = self._check_arguments(tool_name, kwargs)
+        if error:
+            return error, []
         
-        return self.tools[tool_name].execute(**kwargs)
+        return self.tools[tool_name].execute_with_sources(**kwargs)
     
-    def get_last_sources(self) -> list:
-        """Get sources from the last search operation"""
-        # Check all tools for last_sources attribute
-        for tool in self.tools.values():
-            if hasattr(tool, 'last_sources') and tool.last_sources:
-                return tool.last_sources
-        return []
+    def _check_arguments(self, tool_name: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        """Return an error message if kwargs do not fit the tool's execute() signature"""
+        try:
+            self._signatures[tool_name].bind(**kwargs)
+        except TypeError as e:
+            return f"Invalid arguments for tool '{tool_name}': {e}"
+        return None
     
-    def reset_sources(self):
-        """Reset sources from all tools that track sources"""
+    def clear_caches(self):
+        """Clear cached results from all tools that keep one (e.g. after new content is added)"""
         for tool in self.tools.values():
-            if hasattr(tool, 'last_sources'):
-                tool.last_sources = []
\ No newline at end of file
+            if hasattr(tool, 'cache'):
+                tool.cache.clear()
\ No newline at end of file
@@ -0,0 +1,43 @@
+from typing import Callable, List, Optional
+import numpy as np
+
+class SemanticCache:
+    """Caches answers by query embedding so near-duplicate questions skip the LLM"""
+
+    def __init__(self, embedding_function: Callable[[List[str]], List],
+                 threshold: float = 0.95, max_size: int = 256):
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.max_size = max_size
+        self._embeddings: List[np.ndarray] = []
+        self._answers: List[str] = []
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed text and L2-normalize it so dot products are cosine similarities"""
+        embedding = np.asarray(self.embedding_function([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def lookup(self, embedding: np.ndarray) -> Optional[str]:
+        """Return the cached answer of the most similar prior query above the threshold"""
+        if not self._embeddings:
+            return None
+
+        similarities = np.stack(self._embeddings) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] > self.threshold:
+            return self._answers[best]
+        return None
+
+    def add(self, embedding: np.ndarray, answer: str):
+        """Store an answer, dropping the oldest entry when the cache is full"""
+        self._embeddings.append(embedding)
+        self._answers.append(answer)
+        if len(self._answers) > self.max_size:
+            del self._embeddings[0]
+            del self._answers[0]
+
+    def clear(self):
+        """Drop all cached answers"""
+        self._embeddings = []
+        self._answers = []
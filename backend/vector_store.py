@@ -1,10 +1,18 @@
+import json
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
 from models import Course, CourseChunk
 from sentence_transformers import SentenceTransformer
 
+# Prefer orjson for the hot lessons_json parses; it is a drop-in for json.loads
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 @dataclass
 class SearchResults:
     """Container for search results with metadata"""
@@ -50,6 +58,51 @@ class VectorStore:
         # Create collections for different types of data
         self.course_catalog = self._create_collection("course_catalog")  # Course titles/instructors
         self.course_content = self._create_collection("course_content")  # Actual course material
+        
+        # Per-instance memo of course name resolution, cleared whenever the catalog changes
+        self._cached_course_lookup = lru_cache(maxsize=256)(self._lookup_course_name)
+        
+        # In-memory copy of the (nearly static) course catalog, keyed by title
+        self._catalog_cache: Dict[str, Dict[str, Any]] = {}
+        self.load_course_catalog_cache()
+    
+    def load_course_catalog_cache(self):
+        """Load all course catalog metadata into memory"""
+        try:
+            results = self.course_catalog.get()
+            self._catalog_cache = {
+                course_id: self._build_catalog_entry(metadata)
+                for course_id, metadata in zip(results.get('ids') or [], results.get('metadatas') or [])
+            }
+        except Exception as e:
+            print(f"Error loading course catalog cache: {e}")
+            self._catalog_cache = {}
+    
+    @staticmethod
+    def _build_catalog_entry(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy catalog metadata with parsed lessons and its formatted outline precomputed"""
+        entry = dict(metadata)
+        try:
+            lessons = json_loads(entry.get('lessons_json') or '[]')
+        except json.JSONDecodeError:
+            lessons = []
+        entry['lessons'] = lessons
+        
+        # Format the outline once; it depends only on the metadata
+        outline_lines = [f"Course Title: {entry.get('title')}"]
+        outline_lines.append(f"Course Link: {entry.get('course_link', 'No link available')}")
+        outline_lines.append("Lessons:")
+        
+        if lessons:
+            for lesson in lessons:
+                lesson_num = lesson.get('lesson_number', 'Unknown')
+                lesson_title = lesson.get('lesson_title', 'Untitled')
+                outline_lines.append(f"  {lesson_num}. {lesson_title}")
+        else:
+            outline_lines.append("  No lessons available")
+        
+        entry['outline_text'] = "\n".join(outline_lines)
+        return entry
     
     def _create_collection(self, name: str):
         """Create or get a ChromaDB collection"""
@@ -102,19 +155,25 @@ class VectorStore:
     def _resolve_course_name(self, course_name: str) -> Optional[str]:
         """Use vector search to find best matching course by name"""
         try:
-            results = self.course_catalog.query(
-                query_texts=[course_name],
-                n_results=1
-            )
-            
-            if results['documents'][0] and results['metadatas'][0]:
-                # Return the title (which is now the ID)
-                return results['metadatas'][0][0]['title']
+            return self._cached_course_lookup(course_name)
         except Exception as e:
+            # Failed lookups raise, so lru_cache never memoizes them
             print(f"Error resolving course name: {e}")
         
         return None
     
+    def _lookup_course_name(self, course_name: str) -> Optional[str]:
+        """Query the catalog for the best matching course title (raises on search errors)"""
+        results = self.course_catalog.query(
+            query_texts=[course_name],
+            n_results=1
+        )
+        
+        if results['documents'][0] and results['metadatas'][0]:
+            # Return the title (which is now the ID)
+            return results['metadatas'][0][0]['title']
+        return None
+    
     def _build_filter(self, course_title: Optional[str], lesson_number: Optional[int]) -> Optional[Dict]:
         """Build ChromaDB filter from search parameters"""
         # Build filter conditions only for non-None parameters
@@ -131,8 +190,6 @@ class VectorStore:
     
     def add_course_metadata(self, course: Course):
         """Add course information to the catalog for semantic search"""
-        import json
-
         course_text = course.title
         
         # Build lessons metadata and serialize as JSON string
@@ -144,17 +201,22 @@ class VectorStore:
                 "lesson_link": lesson.lesson_link
             })
         
+        metadata = {
+            "title": course.title,
+            "instructor": course.instructor,
+            "course_link": course.course_link,
+            "lessons_json": json.dumps(lessons_metadata),  # Serialize as JSON string
+            "lesson_count": len(course.lessons)
+        }
         self.course_catalog.add(
             documents=[course_text],
-            metadatas=[{
-                "title": course.title,
-                "instructor": course.instructor,
-                "course_link": course.course_link,
-                "lessons_json": json.dumps(lessons_metadata),  # Serialize as JSON string
-                "lesson_count": len(course.lessons)
-            }],
+            metadatas=[metadata],
             ids=[course.title]
         )
+        
+        # Keep in-memory catalog and name resolution in sync
+        self._catalog_cache[course.title] = self._build_catalog_entry(metadata)
+        self._cached_course_lookup.cache_clear()
     
     def add_course_content(self, chunks: List[CourseChunk]):
         """Add course content chunks to the vector store"""
@@ -186,6 +248,9 @@ class VectorStore:
             self.course_content = self._create_collection("course_content")
         except Exception as e:
             print(f"Error clearing data: {e}")
+        finally:
+            self._catalog_cache = {}
+            self._cached_course_lookup.cache_clear()
     
     def get_existing_course_titles(self) -> List[str]:
         """Get all existing course titles from the vector store"""
@@ -212,7 +277,6 @@ class VectorStore:
     
     def get_all_courses_metadata(self) -> List[Dict[str, Any]]:
         """Get metadata for all courses in the vector store"""
-        import json
         try:
             results = self.course_catalog.get()
             if results and 'metadatas' in results:
@@ -221,7 +285,7 @@ class VectorStore:
                 for metadata in results['metadatas']:
                     course_meta = metadata.copy()
                     if 'lessons_json' in course_meta:
-                        course_meta['lessons'] = json.loads(course_meta['lessons_json'])
+                        course_meta['lessons'] = json_loads(course_meta['lessons_json'])
                         del course_meta['lessons_json']  # Remove the JSON string version
                     parsed_metadata.append(course_meta)
                 return parsed_metadata
@@ -230,6 +294,22 @@ class VectorStore:
             print(f"Error getting courses metadata: {e}")
             return []
 
+    def get_catalog_entry(self, course_title: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a course's catalog entry (with parsed lessons and outline text), loading
+        and caching it from Chroma on a miss. Chroma errors propagate to the caller.
+        """
+        entry = self._catalog_cache.get(course_title)
+        if entry is None:
+            # Get course by ID (title is the ID)
+            results = self.course_catalog.get(ids=[course_title])
+            if not results or not results.get('metadatas'):
+                return None
+            
+            entry = self._build_catalog_entry({"title": course_title, **results['metadatas'][0]})
+            self._catalog_cache[course_title] = entry
+        return entry
+    
     def get_course_link(self, course_title: str) -> Optional[str]:
         """Get course link for a given course title"""
         try:
@@ -245,7 +325,6 @@ class VectorStore:
     
     def get_lesson_link(self, course_title: str, lesson_number: int) -> Optional[str]:
         """Get lesson link for a given course title and lesson number"""
-        import json
         try:
             # Get course by ID (title is the ID)
             results = self.course_catalog.get(ids=[course_title])
@@ -253,7 +332,7 @@ class VectorStore:
                 metadata = results['metadatas'][0]
                 lessons_json = metadata.get('lessons_json')
                 if lessons_json:
-                    lessons = json.loads(lessons_json)
+                    lessons = json_loads(lessons_json)
                     # Find the lesson with matching number
                     for lesson in lessons:
                         if lesson.get('lesson_number') == lesson_number:
@@ -261,4 +340,37 @@ class VectorStore:
             return None
         except Exception as e:
             print(f"Error getting lesson link: {e}")
-    
\ No newline at end of file
+            return None
+    
+    def get_lesson_links_bulk(self, lessons: List[Tuple[str, int]]) -> Dict[Tuple[str, int], str]:
+        """Get lesson links for many (course title, lesson number) pairs with one catalog fetch"""
+        links = {}
+        if not lessons:
+            return links
+        
+        wanted = set(lessons)
+        titles = {title for title, _ in wanted}
+        try:
+            # Use already-parsed lessons from the catalog cache where possible
+            course_lessons = [
+                (title, self._catalog_cache[title]['lessons'])
+                for title in titles if title in self._catalog_cache
+            ]
+            
+            # Fetch any remaining courses by ID (title is the ID) in one call
+            missing = [title for title in titles if title not in self._catalog_cache]
+            if missing:
+                results = self.course_catalog.get(ids=missing)
+                for metadata in results.get('metadatas') or []:
+                    course_lessons.append(
+                        (metadata.get('title'), json_loads(metadata.get('lessons_json') or '[]'))
+                    )
+            
+            for course_title, parsed_lessons in course_lessons:
+                for lesson in parsed_lessons:
+                    key = (course_title, lesson.get('lesson_number'))
+                    if key in wanted and lesson.get('lesson_link'):
+                        links[key] = lesson['lesson_link']
+        except Exception as e:
+            print(f"Error getting lesson links: {e}")
+        return links
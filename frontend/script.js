@@ -68,7 +68,7 @@ async function sendMessage() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 
     try {
-        const response = await fetch(`${API_URL}/query`, {
+        const response = await fetch(`${API_URL}/query/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -94,16 +94,54 @@ async function sendMessage() {
             throw new Error(errorMessage);
         }
 
-        const data = await response.json();
-        
-        // Update session ID if new
-        if (!currentSessionId) {
-            currentSessionId = data.session_id;
+        // Render deltas as they arrive over server-sent events
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        let streamingContent = null;
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const rawEvent of events) {
+                if (!rawEvent.startsWith('data: ')) continue;
+                const event = JSON.parse(rawEvent.slice(6));
+
+                if (event.type === 'delta') {
+                    // Replace loading message with the message being streamed
+                    if (!streamingContent) {
+                        loadingMessage.innerHTML = '<div class="message-content"></div>';
+                        streamingContent = loadingMessage.querySelector('.message-content');
+                    }
+                    answer += event.content;
+                    streamingContent.innerHTML = marked.parse(answer);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event.type === 'reset') {
+                    // Text so far was a preamble to tool calls; show loading until the real answer
+                    answer = '';
+                    streamingContent = null;
+                    loadingMessage.innerHTML = createLoadingMessage().innerHTML;
+                } else if (event.type === 'done') {
+                    // Update session ID if new
+                    if (!currentSessionId) {
+                        currentSessionId = event.session_id;
+                    }
+
+                    // Re-render the complete message with its sources
+                    loadingMessage.remove();
+                    addMessage(answer, 'assistant', event.sources);
+                }
+            }
         }
 
-        // Replace loading message with response
-        loadingMessage.remove();
-        addMessage(data.answer, 'assistant', data.sources);
+        if (loadingMessage.isConnected) {
+            throw new Error('Query failed: response stream ended unexpectedly');
+        }
 
     } catch (error) {
         // Replace loading message with error